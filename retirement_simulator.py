@@ -28,18 +28,124 @@
 # TODO: Add ability to adjust certain parameters during certain years.
 # TODO: Add randomness/monte carlo aspects
 
-import pandas as pd
+# Performance note: a lifetime is at most ~80 years of a handful of float
+# columns, which fits in L1 cache, so data layout and memory bandwidth don't
+# matter here. The cost is Python overhead per year and per tax bracket,
+# which is why the simulation is vectorized over years instead of
+# restructured for memory. The one recurrence that can't be (wealth) is a
+# short NumPy loop, and only batched runs use numba for it, if installed.
+
+import numpy as np
 import math
 import copy
 
+import functools
+
 ############################
 # Helper functions
-def Dprint(text, display=False): # For debugging
-    if display:
-        print(text)
-
 def place_value(number):
     return ("{:,}".format(number))
+
+# Fewest realizations for which solve_linear_recurrence(parallel=True) uses
+# threads. Below this, starting them costs more than it saves.
+PARALLEL_MIN_REALIZATIONS = 10000
+
+def solve_linear_recurrence(x0, growth, inflow, parallel = False):
+    """
+        Solves x[t+1] = growth[t]*x[t] + inflow[t] along the last axis.
+        Returns x[..., 0], ..., x[..., T] where T is growth.shape[-1]. Any
+        leading axes are independent recurrences (x0 has their shape).
+
+        With parallel, large batches are spread over threads. numba's thread
+        pool does not survive a fork, so don't fork the process afterwards.
+    """
+    shape = growth.shape
+    kernel = None
+    if len(shape) > 1: # Single runs don't need numba
+        kernel = _recurrence_kernel(bool(parallel and np.prod(shape[:-1]) >= PARALLEL_MIN_REALIZATIONS))
+    if kernel is not None:
+        # The kernel is compiled for (writable) float arrays only
+        x0 = np.array(np.broadcast_to(x0, shape[:-1]), dtype=float).reshape(-1)
+        growth = np.asarray(growth, dtype=float).reshape(-1, shape[-1])
+        inflow = np.asarray(inflow, dtype=float).reshape(-1, shape[-1])
+        x = kernel(x0, growth, inflow)
+        return x.reshape(shape[:-1] + (shape[-1] + 1,))
+
+    # Step through the years, all realizations at once. There are only ~80
+    # years, and unlike a cumprod/cumsum closed form this stays exact when
+    # growth is 0 (e.g. withdrawing everything in a year).
+    x = np.empty(shape[:-1] + (shape[-1] + 1,))
+    x[..., 0] = x0
+    for t in range(shape[-1]):
+        x[..., t+1] = growth[..., t]*x[..., t] + inflow[..., t]
+    return x
+
+@functools.lru_cache(maxsize=None)
+def _recurrence_kernel(parallel = False):
+    """
+        numba kernel for solve_linear_recurrence over many realizations, or
+        None if numba isn't installed. numba is slow to import, so it is only
+        imported (and the kernel compiled, or loaded from the on disk cache)
+        the first time a batched run needs it. The parallel kernel spreads
+        the realizations, which are independent, over threads.
+    """
+    try:
+        from numba import njit, prange
+    except ImportError:
+        return None
+
+    realizations = prange if parallel else range
+    @njit('float64[:, :](float64[:], float64[:, :], float64[:, :])', cache=True, parallel=parallel)
+    def step_linear_recurrences(x0, growth, inflow):
+        x = np.empty((growth.shape[0], growth.shape[1] + 1))
+        for i in realizations(growth.shape[0]):
+            x[i, 0] = x0[i]
+            for t in range(growth.shape[1]):
+                x[i, t+1] = growth[i, t]*x[i, t] + inflow[i, t]
+        return x
+    return step_linear_recurrences
+
+def bracket_table(brackets):
+    """
+        Converts ((lo, hi, rate), ...) brackets into the arrays progressive_tax
+        uses: lo, hi, rates and the total tax owed at the bottom of each bracket.
+    """
+    lo, hi, rates = (np.array(column, dtype=float) for column in zip(*brackets))
+    offsets = np.concatenate(([0.0], np.cumsum((hi[:-1] - lo[:-1])*rates[:-1])))
+    return lo, hi, rates, offsets
+
+def progressive_tax(income, table, adj = 1.0):
+    """
+        Tax on income given a bracket_table, with the brackets scaled by adj
+        (e.g. inflation since the base year). Works elementwise on arrays.
+    """
+    lo, hi, rates, offsets = table
+    # Scaling the brackets by adj is the same as taxing income/adj and scaling the result.
+    income = np.asarray(income, dtype=float)/adj
+    i = np.searchsorted(lo, income) - 1 # Highest bracket the income reaches into
+    tax = offsets[i] + (np.minimum(income, hi[i]) - lo[i])*rates[i]
+    return np.where(i >= 0, tax*adj, 0.0)
+############################
+
+############################
+# Tax brackets: (lower bound, upper bound, rate)
+
+# Using 2019 single filer rates
+# https://taxfoundation.org/2019-tax-brackets/
+FED_BRACKETS = ((0, 9700, 0.10), (9700, 39475, 0.12), (39475, 84200, 0.22), (84200, 160725, 0.24),
+                (160725, 204100, 0.32), (204100, 510300, 0.35), (510300, float('inf'), 0.37))
+FED_TABLE = bracket_table(FED_BRACKETS)
+
+# Long term capital gains. Base year: 2019
+# 2019 rates: https://www.nerdwallet.com/blog/taxes/capital-gains-tax-rates/
+LTCG_BRACKETS = ((0, 39375, 0.1),
+                 (39376, 434550, 0.15),
+                 (434551, float('inf'), 0.37))
+LTCG_TABLE = bracket_table(LTCG_BRACKETS)
+
+# Flat state tax rate. Based on NY state tax. Includes NYC city tax
+# https://www.thebalance.com/cities-that-levy-income-taxes-3193246
+STATE_TAX_RATE = 0.10
 ############################
 
 
@@ -53,15 +159,11 @@ class Event():
         else:
             self.end_age = end_age
 
-        self.active = False
         self.net_flow = net_flow
 
-    def update(self, simulation_obj):
-
-        if self.start_age <= simulation_obj.age < self.end_age:
-            self.active = True
-        else:
-            self.active = False
+    def clone(self):
+        # Events only hold plain values, so a shallow copy is a full copy
+        return copy.copy(self)
 
 
 class Kid(Event):
@@ -69,25 +171,19 @@ class Kid(Event):
     def __init__(self, start_age, college = True):
         super().__init__(start_age)
 
-        self.kid_age = 0
         self.college = college
 
-
-    def update(self, simulation_obj):
-        super().update(simulation_obj)
-
-        if self.active:
-            if self.kid_age < 18:
-                self.net_flow = -simulation_obj.child_costs
-            elif self.kid_age < 22 and self.college:
-                self.net_flow = -simulation_obj.college_price
-            else:
-                self.net_flow = 0
-                 # TODO: Your child could potentially give back.
-                 # Run simlution for the child to estimate how much they will give back????
-                 # Simulate child getting a disease (???)
-
-            self.kid_age += 1
+    @staticmethod
+    def net_flows(kid_age, college, child_costs, college_price):
+        """
+            Net flow of raising kids of age kid_age, elementwise over arrays.
+            child_costs and college_price are the (inflated) costs that year.
+        """
+        # TODO: Your child could potentially give back.
+        # Run simlution for the child to estimate how much they will give back????
+        # Simulate child getting a disease (???)
+        return np.where(kid_age < 18, -child_costs,
+                        np.where((kid_age < 22) & college, -college_price, 0.0))
 
 
 class Disease(Event):
@@ -102,7 +198,11 @@ class Divorce(Event):
 
 class retirementSimulator():
 
-
+    # Tax schedules, built once at import. Kept as class attributes so a
+    # subclass can simulate e.g. a different state or filing status.
+    fed_tax_table = FED_TABLE
+    ltcg_tax_table = LTCG_TABLE
+    state_tax_rate = STATE_TAX_RATE
 
     # TODO: Would storing these things in a dictionary help?
     def __init__(self, starting_wealth = -30000, rate_of_return = 0.07,
@@ -218,197 +318,277 @@ class retirementSimulator():
         # because, in python, the default parameters are evaluted in the function header before
         # it ever gets called. If you don't make a copy, the same event object in the default list
         # would be shared among multiple retirementSimulator instances.
-        self.events = copy.deepcopy(events)
-        self.events_save = copy.deepcopy(events)
+        self.events = [event.clone() for event in events]
 
-        # Storage container
-        self.summaryDf = None
+        # Storage container for the last run_simulation: the columns of
+        # the summary as NumPy arrays (see simulate). summaryDf wraps it.
+        self.lifetime = None
+        self._summaryDf = None
 
-        self.age = start_working_age
+        # yearly_schedule of the last run_simulation, reused to re-simulate
+        # other retirement ages in get_earliest_retirement
+        self._schedule = None
     ################################################################################
     ################################################################################
 
-    def update_events(self):
-        for event in self.events:
-            event.update(self)
-
-    def total_events_net_flow(self):
-        total_net_flow = 0
-        for event in self.events:
-            if event.active:
-                total_net_flow += event.net_flow
-        return total_net_flow
+    def total_events_net_flow(self, ages, child_costs, college_price):
+        """
+            Net flow of all events for each age in ages, given the costs for
+            those ages (which may have leading realization axes).
+            Events are laid out as arrays (one element per event) and evaluated
+            on an (events x ... x years) grid.
+        """
+        def per_event(values, dtype):
+            return np.array(values, dtype=dtype).reshape((-1,) + (1,)*np.ndim(child_costs))
 
+        # Ages are whole years, so an event is active from ceil(start_age) up to
+        # ceil(end_age). Open ended events (end_age = inf) stop with the
+        # simulation, which keeps the grid in integers.
+        starts = per_event([math.ceil(event.start_age) for event in self.events], ages.dtype)
+        ends = per_event([math.ceil(min(event.end_age, ages[-1] + 1)) for event in self.events], ages.dtype)
+        net_flows = per_event([event.net_flow for event in self.events], float)
+        is_kid = per_event([isinstance(event, Kid) for event in self.events], bool)
+        college = per_event([getattr(event, 'college', False) for event in self.events], bool)
 
-    def calculate_longterm_cap_gains_tax(self, amnt_to_sell, yrs_since_base):
-        tax = 0
-        # Base year: 2019
-        # 2019 rates: https://www.nerdwallet.com/blog/taxes/capital-gains-tax-rates/
+        active = (starts <= ages) & (ages < ends)
+        # A kid ages one year for every simulated year they are a part of
+        kid_age = ages - np.maximum(starts, ages[0])
+        flows = np.where(is_kid, Kid.net_flows(kid_age, college, child_costs, college_price), net_flows)
+        return np.where(active, flows, 0.0).sum(axis=0)
 
-        brackets = {(0,39375):              0.1,
-                    (39376, 434550):        0.15,
-                    (434551, float('inf')): 0.37}
 
-        adj_brackets = {(bracket[0]*((self.inflation+1)**yrs_since_base), bracket[1]*((self.inflation+1)**yrs_since_base)): rate \
-                                        for bracket, rate in brackets.items()}
+    # The tax helpers take inflation_factor, the growth in prices since the
+    # base year of the brackets ((1+inflation)**yrs_since_base), so callers
+    # can compute it once and share it.
 
-        for bracket in adj_brackets:
-            if amnt_to_sell > bracket[0]:
-                tax += adj_brackets[bracket]*(min(amnt_to_sell, bracket[1])-bracket[0])
-        return tax
+    def calculate_longterm_cap_gains_tax(self, amnt_to_sell, inflation_factor):
+        return progressive_tax(amnt_to_sell, self.ltcg_tax_table, adj = inflation_factor)
 
-    def calculate_shortterm_cap_gains_tax(self, amnt_to_sell):
+    def calculate_shortterm_cap_gains_tax(self, amnt_to_sell, inflation_factor):
         # Short term capitals gains are taxed as ordinary income
-        return self.calculate_federal_tax(amnt_to_sell)
-
-
-    def calculate_state_tax(self):
-        # Based on NY state tax. Includes NYC city tax
-        # https://www.thebalance.com/cities-that-levy-income-taxes-3193246
-        return self.wage*0.10
-
-    def calculate_federal_tax(self, yrs_since_base):
-        tax = 0
-        # Using 2019 single filer rates
-        # https://taxfoundation.org/2019-tax-brackets/
-        brackets = {(0,9700):0.1,(9700, 39475):0.12, (39475, 84200):0.22, (84200, 160725):0.24, (160725, 204100): 0.32, (204100, 510300):0.35, (510300, float('inf')):0.37}
-
-        adj_brackets = {(bracket[0]*((self.inflation+1)**yrs_since_base), bracket[1]*((self.inflation+1)**yrs_since_base)): rate \
-                                        for bracket, rate in brackets.items()}
-
-        for bracket in adj_brackets:
-            if self.wage > bracket[0]:
-                tax += adj_brackets[bracket]*(min(self.wage, bracket[1])-bracket[0])
-        return tax
-
-    def run_simulation(self):
-
-        lifetime = []
-
-        ################
-        # Working years
-        ###############
-
-        # TODO: Separate retirement and working years into separate events maybe
-        for i in range(self.start_working_age, self.target_retirement_age):
-
-          self.update_events()
-          self.total_wealth += self.total_events_net_flow()
-
-          withdrawl_pre = self.total_wealth*self.withdrawl_rate
-          withdrawl_post = withdrawl_pre - self.calculate_longterm_cap_gains_tax(withdrawl_pre, yrs_since_base = i - self.start_working_age)
-          lifetime.append({'Age': i, 'Total Wealth': self.total_wealth,
-                           "Wage": self.wage,
-                           "Withdrawl (post tax)": None,
-                           "Cost of Living": self.cost_of_living,
-                           "Portfolio Returns": self.total_wealth*self.rate_of_return,
-                           "Surplus": None,
-                           "Surplus (Present $)": None,
-                           "Theoretical Withdrawl (post tax)": withdrawl_post,
-                           'Theoretical Surplus': withdrawl_post - self.cost_of_living,
-                           'Theoretical Surplus (Present $)': (withdrawl_post - self.cost_of_living)/(1+self.inflation)**(i - self.start_working_age) # PDV calculation
-                           })
+        return self.calculate_federal_tax(amnt_to_sell, inflation_factor)
 
 
-          state_tax = self.calculate_state_tax()
-          federal_tax = self.calculate_federal_tax(yrs_since_base = i - self.start_working_age)
+    def calculate_federal_tax(self, income, inflation_factor):
+        return progressive_tax(income, self.fed_tax_table, adj = inflation_factor)
 
+    def yearly_schedule(self, batch_shape = ()):
+        """
+            The parts of a simulation that don't depend on the retirement age,
+            for every year: inflation since the base year, costs, wage, the
+            take home pay left after taxes and cost of living, and the events'
+            net flow. batch_shape is the shape of the realizations (see simulate).
+        """
+        ages = np.arange(self.start_working_age, self.death_age + 1)
+        yrs_since_base = ages - self.start_working_age
+        def per_year(param): # Lines up a parameter against the year axis
+            return np.broadcast_to(param, batch_shape)[..., None]
+
+        # Costs increase each year
+        inflation_factor = (1 + per_year(self.inflation))**yrs_since_base
+        cost_of_living = per_year(self.cost_of_living)*inflation_factor
+        child_costs = per_year(self.child_costs)*inflation_factor
+        college_price = per_year(self.college_price)*inflation_factor
+
+        # Wage increases each year
+        wage = per_year(self.wage)*(1 + per_year(self.yearly_raise))**yrs_since_base
+        state_tax = wage*self.state_tax_rate
+        federal_tax = self.calculate_federal_tax(wage, inflation_factor)
+
+        return {'ages': ages,
+                'inflation_factor': inflation_factor,
+                'cost_of_living': cost_of_living,
+                'wage': wage,
+                'take_home': wage - state_tax - federal_tax - cost_of_living,
+                'events_net_flow': self.total_events_net_flow(ages, child_costs, college_price)}
+
+    def _batch_shape(self, target_retirement_age):
+        """
+            Shape of the realizations simulated when retiring at
+            target_retirement_age (see simulate). () for a single run.
+        """
+        params = [self.total_wealth, self.rate_of_return, self.cost_of_living, self.inflation,
+                  self.wage, self.yearly_raise, self.withdrawl_rate, self.child_costs,
+                  self.college_price, target_retirement_age]
+        return np.broadcast_shapes(*(np.shape(param) for param in params))
 
-          # The amount we save each year is our total wage from our job + our earnings from our portfolio
-          # minus the amount we pay in taxes and the current cost of living
-          self.total_wealth += (self.wage -state_tax- federal_tax - self.cost_of_living)+self.total_wealth*self.rate_of_return
-
-          # Costs increase each year
-          self.cost_of_living += self.cost_of_living*self.inflation
-          self.child_costs += self.child_costs*self.inflation
-          self.college_price += self.college_price*self.inflation
-
-          # Wage increases each year
-          self.wage *= (self.yearly_raise+1)
-
-          self.age += 1
-
+    def simulate(self, target_retirement_age, schedule = None, parallel = False):
+        """
+            Simulates a lifetime retiring at target_retirement_age, using this
+            simulator's other parameters. Returns the summary columns as a dict
+            of arrays, one element per year.
+
+            The money and rate parameters (and target_retirement_age) can also be
+            1-D arrays with one value per realization, e.g. for Monte Carlo runs.
+            All realizations are simulated at once and each column (except 'Age')
+            then has shape (realizations, years). Ages and events are shared.
+
+            schedule is a yearly_schedule of this simulator for the same
+            realizations, if one was already computed. parallel spreads large
+            batches over threads (see solve_linear_recurrence).
+        """
+        batch_shape = self._batch_shape(target_retirement_age)
+        def per_year(param): # Lines up a parameter against the year axis
+            return np.broadcast_to(param, batch_shape)[..., None]
+
+        if schedule is None:
+            schedule = self.yearly_schedule(batch_shape)
+        ages = schedule['ages']
+        inflation_factor = schedule['inflation_factor']
+        cost_of_living = schedule['cost_of_living']
+        events_net_flow = schedule['events_net_flow']
+
+        working = ages < per_year(target_retirement_age)
+        rate_of_return = per_year(self.rate_of_return)
+        withdrawl_rate = per_year(self.withdrawl_rate)
+        return_growth = 1 + rate_of_return
+
+        # While working, we save our total wage from our job
+        # minus the amount we pay in taxes and the current cost of living
+        savings = np.where(working, schedule['take_home'], 0.0)
 
         ################
-        # Retirement years
+        # Wealth
         ################
 
-        for i in range(self.target_retirement_age, self.death_age+1):
-
-            self.update_events()
-            self.total_wealth += self.total_events_net_flow()
-
-            withdrawl_pre = self.total_wealth*self.withdrawl_rate
-            withdrawl_post = withdrawl_pre - self.calculate_longterm_cap_gains_tax(withdrawl_pre, yrs_since_base = i - self.start_working_age)
-
-            lifetime.append({'Age': i, 'Total Wealth': self.total_wealth,
-                             "Wage": None,
-                             "Withdrawl (post tax)": withdrawl_post,
-                             "Cost of Living": self.cost_of_living,
-                             "Portfolio Returns": self.total_wealth*self.rate_of_return,
-                             "Surplus": withdrawl_post - self.cost_of_living,
-                             "Surplus (Present $)":  (withdrawl_post - self.cost_of_living)/(1+self.inflation)**(i - self.start_working_age),
-                             "Theoretical Withdrawl (post tax)": None,
-                             'Theoretical Surplus': None,
-                             'Theoretical Surplus (Present $)': None
-                            })
-
-
-            # Costs increase each year
-            self.cost_of_living += self.cost_of_living*self.inflation
-            self.child_costs += self.child_costs*self.inflation
-            self.college_price += self.college_price*self.inflation
-
+        # Total wealth (after each year's events) follows
+        #   wealth[t+1] = growth[t]*wealth[t] + inflow[t]
+        # While working, wealth grows by the portfolio returns and we add our savings.
+        # In retirement, we withdraw from wealth instead.
+        growth = np.where(working, return_growth, return_growth - withdrawl_rate)
+        inflow = events_net_flow[..., 1:] + savings[..., :-1]
+        total_wealth = solve_linear_recurrence(per_year(self.total_wealth)[..., 0] + events_net_flow[..., 0],
+                                               growth[..., :-1], inflow, parallel)
+
+        withdrawl_pre = total_wealth*withdrawl_rate
+        withdrawl_post = withdrawl_pre - self.calculate_longterm_cap_gains_tax(withdrawl_pre, inflation_factor)
+        surplus = withdrawl_post - cost_of_living
+        surplus_present = surplus/inflation_factor # PDV calculation
+
+        # One row per simulated year, stored column-wise in summary order.
+        # Columns that don't apply to a given year (e.g. 'Wage' in retirement) are NaN.
+        def while_working(values):
+            return np.where(working, values, np.nan)
+        def in_retirement(values):
+            return np.where(working, np.nan, values)
+
+        # Age and Cost of Living are copied so the lifetime doesn't share
+        # arrays with the schedule, which later simulations may reuse.
+        lifetime = {'Age': ages.copy(),
+                    'Total Wealth': total_wealth,
+                    'Portfolio Returns': total_wealth*rate_of_return,
+                    'Wage': while_working(schedule['wage']),
+                    'Cost of Living': cost_of_living.copy(),
+                    'Withdrawl (post tax)': in_retirement(withdrawl_post),
+                    'Surplus': in_retirement(surplus),
+                    'Surplus (Present $)': in_retirement(surplus_present),
+                    'Theoretical Withdrawl (post tax)': while_working(withdrawl_post),
+                    'Theoretical Surplus': while_working(surplus),
+                    'Theoretical Surplus (Present $)': while_working(surplus_present)}
+
+        return lifetime
+
+    # Parameters that can take one value per realization (see simulate)
+    batch_params = ('starting_wealth', 'rate_of_return', 'cost_of_living', 'inflation',
+                    'wage', 'yearly_raise', 'withdrawl_rate', 'target_retirement_age',
+                    'child_costs', 'college_price')
+
+    @classmethod
+    def run_batch(cls, **params):
+        """
+            Simulates every combination of the given parameter values at once.
+            Parameters in batch_params given as lists/arrays are swept, e.g.
+            wage = [80000, 100000] and rate_of_return = [0.05, 0.07, 0.09] runs
+            6 simulations. Other parameters are shared by all of them.
+
+            Returns the simulator. Its summaryDf is indexed by (realization,
+            year), and each swept attribute (e.g. sim.wage) holds the value used
+            by each realization (starting_wealth is stored as sim.total_wealth).
+            get_earliest_retirement only works on single runs, so it can't be
+            used on the result. Sweeps of PARALLEL_MIN_REALIZATIONS or more
+            simulations are spread over threads, after which the process
+            shouldn't be forked.
+        """
+        for name, value in params.items():
+            if name not in cls.batch_params and name != 'events' and np.ndim(value) > 0:
+                raise ValueError("%s can't be swept, only %s can" % (name, ", ".join(cls.batch_params)))
 
+        swept = {name: np.asarray(value) for name, value in params.items()
+                 if name in cls.batch_params and np.ndim(value) > 0}
+        grids = np.meshgrid(*swept.values(), indexing='ij')
+        params.update({name: grid.reshape(-1) for name, grid in zip(swept, grids)})
 
-            self.total_wealth += self.total_wealth*self.rate_of_return-withdrawl_pre
+        sim = cls(**params)
+        sim.run_simulation(parallel = True)
+        return sim
 
-            self.age += 1
+    def run_simulation(self, parallel = False):
 
+        # The schedule is computed from the current parameters and events on
+        # every run, so edits between runs are picked up.
+        self._schedule = self.yearly_schedule(self._batch_shape(self.target_retirement_age))
+        self.lifetime = self.simulate(self.target_retirement_age, self._schedule, parallel)
+        self._summaryDf = None
 
-        self.summaryDf = pd.DataFrame(lifetime)
-        self.summaryDf = self.summaryDf[['Age', 'Total Wealth',  "Portfolio Returns", "Wage", "Cost of Living",
-                               'Withdrawl (post tax)', 'Surplus',"Surplus (Present $)",
-                               "Theoretical Withdrawl (post tax)", 'Theoretical Surplus', 'Theoretical Surplus (Present $)']]
+    @property
+    def summaryDf(self):
+        """
+            The last run_simulation as a DataFrame, one row per year (None
+            before any run). Built from self.lifetime the first time it's used.
+        """
+        if self._summaryDf is None and self.lifetime is not None:
+            import pandas as pd # Only needed here, and slow to import
 
+            lifetime = self.lifetime
+            index = None
+            if lifetime['Total Wealth'].ndim > 1:
+                # Several realizations: stack them, indexed by (realization, year)
+                n_runs, n_years = lifetime['Total Wealth'].shape
+                lifetime = {column: values.reshape(-1) for column, values in lifetime.items()}
+                lifetime['Age'] = np.tile(self.lifetime['Age'], n_runs)
+                index = pd.MultiIndex.from_product([range(n_runs), range(n_years)], names=['Realization', 'Year'])
 
+            self._summaryDf = pd.DataFrame(lifetime, index=index)
+        return self._summaryDf
 
+    @summaryDf.setter
+    def summaryDf(self, df):
+        self._summaryDf = df
 
     def get_earliest_retirement(self):
         """
-            Gets earliest age in which a 4% withdrawl covers cost of living
+            Gets earliest age in which a 4% withdrawl covers cost of living.
+            Only works on a single realization, not on batched runs.
         """
+        if self.lifetime is not None and self.lifetime['Total Wealth'].ndim > 1:
+            raise ValueError("get_earliest_retirement needs a single realization, "
+                             "but the last simulation has %d" % self.lifetime['Total Wealth'].shape[0])
+
         print("-----------------------")
-        def strictly_increasing(L):
-            return all(x<y for x, y in zip(L, L[1:]))
 
+        if self.lifetime is not None:
 
-        if self.summaryDf is not None:
+            lifetime = self.lifetime
+            vec = (lifetime['Withdrawl (post tax)'] > lifetime['Cost of Living']) | (lifetime['Theoretical Withdrawl (post tax)'] > lifetime['Cost of Living'])
 
-            vec= (self.summaryDf['Withdrawl (post tax)'] > self.summaryDf['Cost of Living']) | (self.summaryDf['Theoretical Withdrawl (post tax)'] > self.summaryDf['Cost of Living'])
+            if vec.any():
+                # Positions of the first and last years where vec is True
+                first, last = vec.argmax(), len(vec) - 1 - vec[::-1].argmax()
 
-            if any(vec):
-                best_age = int(self.summaryDf[vec].iloc[0]['Age'])
+                best_age = int(lifetime['Age'][first])
                 if self.work_till_at_least_save and best_age < self.work_till_at_least_save:
                     best_age = int(self.work_till_at_least)
 
-                newSimulation = retirementSimulator(starting_wealth = self.total_wealth_save, rate_of_return = self.rate_of_return_save,
-                                                    cost_of_living = self.cost_of_living_save, inflation = self.inflation_save,
-                                                    wage = self.wage_save, yearly_raise = self.yearly_raise_save,
-                                                    withdrawl_rate = self.withdrawl_rate_save, start_working_age = self.start_working_age_save,
-                                                    target_retirement_age = int(best_age), work_till_at_least = self.work_till_at_least_save,  death_age = self.death_age_save,
-                                                    child_costs = self.child_costs_save, college_price = self.college_price_save,
-                                                    events = self.events_save)
-
-                newSimulation.run_simulation()
-                new_vec =(newSimulation.summaryDf['Withdrawl (post tax)'] > newSimulation.summaryDf['Cost of Living']) | (newSimulation.summaryDf['Theoretical Withdrawl (post tax)'] > newSimulation.summaryDf['Cost of Living'])
-                runs_out =  int(newSimulation.summaryDf[new_vec].iloc[-1]['Age'])
+                # Re-simulate retiring at best_age with the same parameters
+                new_lifetime = self.simulate(best_age, self._schedule)
+                new_vec = (new_lifetime['Withdrawl (post tax)'] > new_lifetime['Cost of Living']) | (new_lifetime['Theoretical Withdrawl (post tax)'] > new_lifetime['Cost of Living'])
+                runs_out = int(new_lifetime['Age'][len(new_vec) - 1 - new_vec[::-1].argmax()])
 
 
                 #runs_out = self.summaryDf[vec].iloc[-1]['Age']
 
-                starting_retirement_wealth = round(newSimulation.summaryDf[vec].iloc[0]['Total Wealth'], 2)
-                ending_retirement_wealth = round(newSimulation.summaryDf[vec].iloc[-1]['Total Wealth'], 2)
+                starting_retirement_wealth = round(new_lifetime['Total Wealth'][first], 2)
+                ending_retirement_wealth = round(new_lifetime['Total Wealth'][last], 2)
 
                 delta_TW_retirement = round(ending_retirement_wealth - starting_retirement_wealth, 2)
                 increasing_TW = ending_retirement_wealth > starting_retirement_wealth
@@ -439,62 +619,54 @@ class retirementSimulator():
 # %%
 if __name__ == "__main__":
 
+    scenarios = [
+        # Default. Start working at 22, have kid at 27.
+        # Other parameters are fairly pessimistic.
+        dict(events =[Kid(27)]),
 
-    # Default. Start working at 22, have kid at 27.
-    # Other parameters are fairly pessimistic.
-    sim1 = retirementSimulator(events =[Kid(27)])
-    sim1.run_simulation()
-    sim1_results = sim1.summaryDf
-    sim1.get_earliest_retirement()
-
-    # Start working after a master's degree at 23, have kid at 27.
-    sim2 = retirementSimulator(starting_wealth = -30000, rate_of_return = 0.10,
-                 cost_of_living = 40000, inflation = 0.03,
-                 wage = 90000, yearly_raise = 0.04,
-                 withdrawl_rate = 0.04, start_working_age = 23,
-                 target_retirement_age = 50, work_till_at_least = 30, death_age = 100,
-                 events = [Kid(27)])
-    sim2.run_simulation()
-    sim2_results = sim2.summaryDf
-    sim2.get_earliest_retirement()
-
-    # Higher starting wage
-    sim3 = retirementSimulator(starting_wealth = -30000, rate_of_return = 0.10,
-                 cost_of_living = 40000, inflation = 0.03,
-                 wage = 130000, yearly_raise = 0.04,
-                 withdrawl_rate = 0.04, start_working_age = 23,
-                 target_retirement_age = 50, work_till_at_least = 30, death_age = 100)
-    sim3.run_simulation()
-    sim3_results = sim3.summaryDf
-    sim3.get_earliest_retirement()
-
-    # Higher starting wage, but without kids
-    sim4 = retirementSimulator(starting_wealth = -30000, rate_of_return = 0.10,
+        # Start working after a master's degree at 23, have kid at 27.
+        dict(starting_wealth = -30000, rate_of_return = 0.10,
+             cost_of_living = 40000, inflation = 0.03,
+             wage = 90000, yearly_raise = 0.04,
+             withdrawl_rate = 0.04, start_working_age = 23,
+             target_retirement_age = 50, work_till_at_least = 30, death_age = 100,
+             events = [Kid(27)]),
+
+        # Higher starting wage
+        dict(starting_wealth = -30000, rate_of_return = 0.10,
              cost_of_living = 40000, inflation = 0.03,
              wage = 130000, yearly_raise = 0.04,
              withdrawl_rate = 0.04, start_working_age = 23,
-             target_retirement_age = 50, work_till_at_least = 30, death_age = 100, events=[])
-    sim4.run_simulation()
-    sim4_results = sim4.summaryDf
-    sim4.get_earliest_retirement()
+             target_retirement_age = 50, work_till_at_least = 30, death_age = 100),
 
-    # High starting salary after a PhD, with a kid at 27
-    sim5 = retirementSimulator(starting_wealth = -30000, rate_of_return = 0.10,
+        # Higher starting wage, but without kids
+        dict(starting_wealth = -30000, rate_of_return = 0.10,
+             cost_of_living = 40000, inflation = 0.03,
+             wage = 130000, yearly_raise = 0.04,
+             withdrawl_rate = 0.04, start_working_age = 23,
+             target_retirement_age = 50, work_till_at_least = 30, death_age = 100, events=[]),
+
+        # High starting salary after a PhD, with a kid at 27
+        dict(starting_wealth = -30000, rate_of_return = 0.10,
              cost_of_living = 40000, inflation = 0.03,
              wage = 185000, yearly_raise = 0.04,
              withdrawl_rate = 0.04, start_working_age = 26,
-             target_retirement_age = 50, work_till_at_least = 30, death_age = 100, events=[Kid(27)])
-    sim5.run_simulation()
-    sim5_results = sim5.summaryDf
-    sim5.get_earliest_retirement()
-
+             target_retirement_age = 50, work_till_at_least = 30, death_age = 100, events=[Kid(27)]),
 
-    # High starting salary after a PhD, with a kid at 27, 28 and 29 (3 kids)
-    sim6 = retirementSimulator(starting_wealth = -30000, rate_of_return = 0.10,
+        # High starting salary after a PhD, with a kid at 27, 28 and 29 (3 kids)
+        dict(starting_wealth = -30000, rate_of_return = 0.10,
              cost_of_living = 40000, inflation = 0.03,
              wage = 185000, yearly_raise = 0.04,
              withdrawl_rate = 0.04, start_working_age = 26,
-             target_retirement_age = 50, work_till_at_least = 30, death_age = 100, events=[Kid(27), Kid(28), Kid(29)])
-    sim6.run_simulation()
-    sim6_results = sim6.summaryDf
-    sim6.get_earliest_retirement()
+             target_retirement_age = 50, work_till_at_least = 30, death_age = 100, events=[Kid(27), Kid(28), Kid(29)]),
+    ]
+
+    sims = []
+    for params in scenarios:
+        sim = retirementSimulator(**params)
+        sim.run_simulation()
+        sim.get_earliest_retirement()
+        sims.append(sim)
+
+    sim1, sim2, sim3, sim4, sim5, sim6 = sims
+    sim1_results, sim2_results, sim3_results, sim4_results, sim5_results, sim6_results = [sim.summaryDf for sim in sims]